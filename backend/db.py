@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -14,5 +15,16 @@ DB_URI = os.getenv("DB_URI")
 if not DB_URI:
     raise ValueError("DB_URI not found in environment variables.")
 
-# Create SQLAlchemy engine
-engine = create_engine(DB_URI)
\ No newline at end of file
+# The API runs on asyncio, so swap the sync MySQL driver in DB_URI
+# (e.g. mysql+pymysql) for aiomysql
+ASYNC_DB_URI = make_url(DB_URI).set(drivername="mysql+aiomysql")
+
+# Create SQLAlchemy async engine
+engine = create_async_engine(
+    ASYNC_DB_URI,
+    pool_size=20,
+    max_overflow=30,
+    pool_recycle=3600,
+    pool_pre_ping=True,
+)
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
\ No newline at end of file
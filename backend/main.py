@@ -2,12 +2,17 @@ from fastapi import FastAPI, Depends, HTTPException
 from fastapi.security.api_key import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from dotenv import load_dotenv
+from datetime import date, datetime, timedelta
+import asyncio
+import hmac
 import os
+import time
 
 from db import engine
 from utils import get_schema_metadata, local_generate_sql
+from sql_templates import NO_MATCH_SQL, generate_sql_from_template
 
 # Load environment variables
 load_dotenv()
@@ -29,33 +34,67 @@ app.add_middleware(
 # API Key dependency
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
+# Recently accepted keys -> time they were verified. Only a key equal to
+# API_KEY is ever stored, so this holds at most one entry.
+_VALID_KEYS = {}
+_VALID_KEY_TTL = 300
+
 async def verify_api_key(api_key: str = Depends(api_key_header)):
-    if api_key != API_KEY:
+    now = time.monotonic()
+    verified_at = _VALID_KEYS.get(api_key)
+    if verified_at and now - verified_at < _VALID_KEY_TTL:
+        return
+
+    # Constant-time comparison; compare bytes so non-ASCII headers can't raise
+    if not hmac.compare_digest((api_key or "").encode(), (API_KEY or "").encode()):
         raise HTTPException(status_code=403, detail="Unauthorized")
+    _VALID_KEYS[api_key] = now
 
 # Request body model
 class QueryRequest(BaseModel):
     question: str
 
+# Column values the MySQL driver returns. With these declared, Pydantic
+# validates rows and writes the response straight to JSON bytes, instead of
+# jsonable_encoder walking every value first. DECIMALs come out as numbers.
+Cell = int | float | str | datetime | date | timedelta | bytes | None
+
+# Response body model; only the key that applies is sent
+class AskResponse(BaseModel):
+    # TIME columns as seconds, as jsonable_encoder sent them
+    model_config = ConfigDict(ser_json_timedelta="float")
+
+    result: list[dict[str, Cell]] | None = None
+    message: str | None = None
+    error: str | None = None
+
 # Ask endpoint
-@app.post("/ask")
-async def ask_data(req: QueryRequest, _: str = Depends(verify_api_key)):
+@app.post("/ask", response_model_exclude_none=True)
+async def ask_data(req: QueryRequest, _: str = Depends(verify_api_key)) -> AskResponse:
     try:
-        schema = get_schema_metadata()
-        sql = local_generate_sql(req.question, schema)
+        sql, params = generate_sql_from_template(req.question)
+        if sql == NO_MATCH_SQL:
+            # The schema is only needed to prompt the GPT-2 fallback, which is
+            # CPU-bound and runs in a worker thread to keep the event loop free
+            schema = await get_schema_metadata()
+            sql, params = await asyncio.to_thread(local_generate_sql, req.question, schema)
         print("Generated SQL:\n", sql)
 
-        # If no valid SQL was generated
-        if sql.strip().startswith("-- No matching SQL"):
-            return {"message": sql.strip()}
+        # Neither a template nor GPT-2 produced SQL worth running
+        if sql == NO_MATCH_SQL:
+            return AskResponse(message=sql)
 
-        with engine.connect() as conn:
-            result = conn.execute(text(sql))
-            rows = [dict(row._mapping) for row in result]
+        # Server-side cursor read in batches, so the driver never buffers the
+        # whole result set next to the rows we build for the response
+        rows = []
+        async with engine.connect() as conn:
+            result = await conn.stream(text(sql), params)
+            async for batch in result.mappings().partitions(1000):
+                rows.extend(dict(m) for m in batch)
 
-        return {"result": rows}
+        return AskResponse(result=rows)
 
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return {"error": str(e)}
+        return AskResponse(error=str(e))
@@ -1,23 +1,49 @@
 import re
+from functools import lru_cache
 
-def generate_sql_from_template(question: str) -> str:
-    q = question.lower().strip()
-
+# Ordered (template id, pattern) pairs, compiled once at import. Earlier
+# entries win when several match, so a question is tried against each in turn.
+TEMPLATES = [(name, re.compile(pat)) for name, pat in [
     # --- Descriptive Summaries ---
-    if re.search(r"(how many|number of)\s+users", q):
-        return "-- Count of users\nSELECT COUNT(*) AS total_users FROM users;"
+    ("users_count", r"(?:how many|number of)\s+users"),
+    ("total_revenue", r"total revenue"),
+    # --- Top/Bottom Rankings ---
+    ("top_category", r"(?:highest|top).*revenue.*category"),
+    ("top_category", r"which category has the highest revenue"),
+    ("top_users", r"top.*(?:customers|users)"),
+    ("top_products", r"(?:most popular|top selling) products?"),
+    # --- Time Trends ---
+    ("revenue_over_time", r"revenue over time"),
+    ("orders_per_day", r"orders per day"),
+    ("monthly_revenue", r"monthly revenue"),
+    # --- Filtered Results ---
+    ("orders_qty", r"(?:orders\s+)?with quantity\s+>\s*(?P<qty>\d+)"),
+    # --- Compare Users by Order Count ---
+    ("users_by_order_count", r"compare users by number of orders"),
+    ("users_by_order_count", r"users by order count"),
+    ("users_more_than", r"users.*more than (?P<min_orders>\d+) orders"),
+    ("orders_between", r"orders.*between (?P<start_date>.+?) and (?P<end_date>.+)"),
+    # --- Group Counts ---
+    ("orders_by_category", r"orders by category"),
+    ("users_by_signup", r"users by signup date"),
+]]
+
+NO_MATCH_SQL = "-- No matching SQL template found for the question."
+
+# Only this much of a question is matched; templates are short phrases, so
+# pasted paragraphs are not lowercased and scanned in full. A template phrase
+# starting past the cut does not match.
+MAX_QUESTION_CHARS = 256
 
-    if re.search(r"total revenue", q):
-        return """
+_STATIC_SQL = {
+    "users_count": "-- Count of users\nSELECT COUNT(*) AS total_users FROM users;",
+    "total_revenue": """
         -- Total revenue from all orders
         SELECT SUM(o.quantity * p.price) AS total_revenue
         FROM orders o
         JOIN products p ON o.product_id = p.id;
-        """
-
-    # --- Top/Bottom Rankings ---
-    if re.search(r"(highest|top).*revenue.*category", q) or re.search(r"which category has the highest revenue", q):
-        return """
+        """,
+    "top_category": """
         -- Category with the highest revenue
         SELECT p.category, SUM(o.quantity * p.price) AS revenue
         FROM orders o
@@ -25,10 +51,8 @@ def generate_sql_from_template(question: str) -> str:
         GROUP BY p.category
         ORDER BY revenue DESC
         LIMIT 1;
-        """
-
-    if re.search(r"top.*(customers|users)", q):
-        return """
+        """,
+    "top_users": """
         -- Top 5 users by total spending
         SELECT u.name, SUM(o.quantity * p.price) AS total_spent
         FROM orders o
@@ -37,10 +61,8 @@ def generate_sql_from_template(question: str) -> str:
         GROUP BY u.id
         ORDER BY total_spent DESC
         LIMIT 5;
-        """
-
-    if re.search(r"(most popular|top selling) products?", q):
-        return """
+        """,
+    "top_products": """
         -- Top selling products by quantity
         SELECT p.name AS product_name, SUM(o.quantity) AS total_sold
         FROM orders o
@@ -48,103 +70,128 @@ def generate_sql_from_template(question: str) -> str:
         GROUP BY p.id
         ORDER BY total_sold DESC
         LIMIT 5;
-        """
-
-    # --- Time Trends ---
-    if re.search(r"revenue over time", q):
-        return """
+        """,
+    "revenue_over_time": """
         -- Daily revenue trend
         SELECT DATE(o.order_date) AS day, SUM(o.quantity * p.price) AS revenue
         FROM orders o
         JOIN products p ON o.product_id = p.id
         GROUP BY day
         ORDER BY day;
-        """
-
-    if re.search(r"orders per day", q):
-        return """
+        """,
+    "orders_per_day": """
         -- Orders per day
         SELECT DATE(order_date) AS day, COUNT(*) AS order_count
         FROM orders
         GROUP BY day
         ORDER BY day;
-        """
-
-    if re.search(r"monthly revenue", q):
-        return """
+        """,
+    "monthly_revenue": """
         -- Monthly revenue trend
         SELECT DATE_FORMAT(order_date, '%Y-%m') AS month, SUM(o.quantity * p.price) AS revenue
         FROM orders o
         JOIN products p ON o.product_id = p.id
         GROUP BY month
         ORDER BY month;
-        """
-
-    # --- Filtered Results ---
-    if re.search(r"(orders\s+)?with quantity\s+>\s*\d+", q):
-        num = re.findall(r"quantity\s*>\s*(\d+)", q)
-        if num:
-            return f"""
-            -- Orders with quantity greater than {num[0]}
-            SELECT o.id AS order_id, p.name AS product_name, o.quantity
-            FROM orders o
-            JOIN products p ON o.product_id = p.id
-            WHERE o.quantity > {num[0]};
-            """
-
-    # --- Compare Users by Order Count ---
-    if re.search(r"compare users by number of orders", q) or re.search(r"users by order count", q):
-        return """
+        """,
+    "users_by_order_count": """
         -- Number of orders by user
         SELECT u.name, COUNT(o.id) AS total_orders
         FROM users u
         JOIN orders o ON u.id = o.user_id
         GROUP BY u.id
         ORDER BY total_orders DESC;
-        """
-
-    if re.search(r"users.*more than \d+ orders", q):
-        num = re.findall(r"more than (\d+)", q)
-        if num:
-            return f"""
-            -- Users with more than {num[0]} orders
-            SELECT u.name, COUNT(o.id) AS total_orders
-            FROM users u
-            JOIN orders o ON u.id = o.user_id
-            GROUP BY u.id
-            HAVING total_orders > {num[0]};
-            """
-
-    if re.search(r"orders.*between .* and .*", q):
-        dates = re.findall(r"between (.+?) and (.+)", q)
-        if dates:
-            start_date, end_date = dates[0]
-            return f"""
-            -- Orders between {start_date.strip()} and {end_date.strip()}
-            SELECT o.id AS order_id, u.name AS user_name, p.name AS product_name, o.quantity, o.order_date
-            FROM orders o
-            JOIN users u ON o.user_id = u.id
-            JOIN products p ON o.product_id = p.id
-            WHERE o.order_date BETWEEN '{start_date.strip()}' AND '{end_date.strip()}';
-            """
-
-    # --- Group Counts ---
-    if re.search(r"orders by category", q):
-        return """
+        """,
+    "orders_by_category": """
         -- Number of orders per product category
         SELECT p.category, COUNT(o.id) AS total_orders
         FROM orders o
         JOIN products p ON o.product_id = p.id
         GROUP BY p.category;
-        """
-
-    if re.search(r"users by signup date", q):
-        return """
+        """,
+    "users_by_signup": """
         -- New users by signup date
         SELECT DATE(created_at) AS signup_date, COUNT(*) AS new_users
         FROM users
         GROUP BY signup_date
         ORDER BY signup_date;
-        """
+        """,
+}
+
+
+def _orders_qty(m: re.Match) -> tuple[str, dict]:
+    return """
+        -- Orders with quantity greater than a threshold
+        SELECT o.id AS order_id, p.name AS product_name, o.quantity
+        FROM orders o
+        JOIN products p ON o.product_id = p.id
+        WHERE o.quantity > :qty;
+        """, {"qty": int(m.group("qty"))}
+
 
-    return "-- No matching SQL template found for the question."
+def _users_more_than(m: re.Match) -> tuple[str, dict]:
+    return """
+        -- Users with more than a given number of orders
+        SELECT u.name, COUNT(o.id) AS total_orders
+        FROM users u
+        JOIN orders o ON u.id = o.user_id
+        GROUP BY u.id
+        HAVING total_orders > :min_orders;
+        """, {"min_orders": int(m.group("min_orders"))}
+
+
+def _orders_between(m: re.Match) -> tuple[str, dict]:
+    return """
+        -- Orders between two dates
+        SELECT o.id AS order_id, u.name AS user_name, p.name AS product_name, o.quantity, o.order_date
+        FROM orders o
+        JOIN users u ON o.user_id = u.id
+        JOIN products p ON o.product_id = p.id
+        WHERE o.order_date BETWEEN :start_date AND :end_date;
+        """, {"start_date": m.group("start_date").strip(), "end_date": m.group("end_date").strip()}
+
+
+# Templates whose bind parameters come from values captured from the question.
+# Values are never formatted into the SQL text, so user input can't inject SQL
+# and each template keeps a single statement text for MySQL to reuse.
+_HANDLERS = {
+    "orders_qty": _orders_qty,
+    "users_more_than": _users_more_than,
+    "orders_between": _orders_between,
+}
+
+
+# /ask calls the matcher on every question, so repeated questions are served
+# from here. Keyed on the normalised question, so case and spacing don't
+# split entries.
+@lru_cache(maxsize=1024)
+def _match_template(q: str, truncated: bool) -> tuple[str, dict]:
+    for name, pattern in TEMPLATES:
+        m = pattern.search(q)
+        if m:
+            handler = _HANDLERS.get(name)
+            # A capture running up to the cut may have lost its tail (half an
+            # end date, a digit of a quantity), so it is not bound
+            if handler and truncated and m.end() == len(q):
+                continue
+            if handler:
+                return handler(m)
+            return _STATIC_SQL[name], {}
+    return NO_MATCH_SQL, {}
+
+
+def generate_sql_from_template(question: str) -> tuple[str, dict]:
+    """
+    Returns the (sql, params) pair for the first template matching the question.
+    sql uses :name placeholders to be executed as text(sql) with params.
+    """
+    q = question.lstrip()
+    truncated = len(q) > MAX_QUESTION_CHARS
+    # Runs of whitespace become one space, so "orders  per day" still matches
+    q = " ".join(q[:MAX_QUESTION_CHARS].split())
+    # ASCII questions take str.lower's fast path; others need full casefolding
+    q = q.lower() if q.isascii() else q.casefold()
+
+    sql, params = _match_template(q, truncated)
+    # Copied so a caller can't alter the cached entry
+    return sql, dict(params)
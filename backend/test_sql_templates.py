@@ -0,0 +1,69 @@
+import unittest
+
+from sql_templates import MAX_QUESTION_CHARS, NO_MATCH_SQL, generate_sql_from_template
+
+
+def matched(question):
+    """The leading SQL comment naming the matched template, and the bind params."""
+    sql, params = generate_sql_from_template(question)
+    return sql.strip().splitlines()[0], params
+
+
+class TemplateMatchTest(unittest.TestCase):
+    CASES = [
+        ("How many users are there?", "-- Count of users", {}),
+        ("number of users", "-- Count of users", {}),
+        ("total revenue", "-- Total revenue from all orders", {}),
+        ("Which category has the highest revenue", "-- Category with the highest revenue", {}),
+        ("top revenue by category", "-- Category with the highest revenue", {}),
+        ("top customers", "-- Top 5 users by total spending", {}),
+        ("top selling products", "-- Top selling products by quantity", {}),
+        ("most popular product", "-- Top selling products by quantity", {}),
+        ("revenue over time", "-- Daily revenue trend", {}),
+        ("orders per day", "-- Orders per day", {}),
+        ("orders  per\tday", "-- Orders per day", {}),
+        ("monthly revenue", "-- Monthly revenue trend", {}),
+        ("orders with quantity > 3", "-- Orders with quantity greater than a threshold", {"qty": 3}),
+        ("with quantity   >5", "-- Orders with quantity greater than a threshold", {"qty": 5}),
+        ("ORDERS\nwith quantity > 2", "-- Orders with quantity greater than a threshold", {"qty": 2}),
+        ("compare users by number of orders", "-- Number of orders by user", {}),
+        ("users by order count", "-- Number of orders by user", {}),
+        ("users with more than 2 orders", "-- Users with more than a given number of orders", {"min_orders": 2}),
+        (
+            "orders between 2024-01-01 and 2024-02-01",
+            "-- Orders between two dates",
+            {"start_date": "2024-01-01", "end_date": "2024-02-01"},
+        ),
+        ("orders by category", "-- Number of orders per product category", {}),
+        ("users by signup date", "-- New users by signup date", {}),
+        ("  Top Customers  ", "-- Top 5 users by total spending", {}),
+    ]
+
+    def test_matches(self):
+        for question, comment, params in self.CASES:
+            with self.subTest(question=question):
+                self.assertEqual(matched(question), (comment, params))
+
+    def test_earlier_template_wins(self):
+        # Both total_revenue and top_users match; total_revenue comes first
+        self.assertEqual(matched("top customers by total revenue"), ("-- Total revenue from all orders", {}))
+
+    def test_no_match(self):
+        self.assertEqual(generate_sql_from_template("hello"), (NO_MATCH_SQL, {}))
+
+    def test_params_are_not_shared(self):
+        _, params = generate_sql_from_template("orders with quantity > 3")
+        params["qty"] = 99
+        self.assertEqual(matched("orders with quantity > 3")[1], {"qty": 3})
+
+    def test_phrase_past_the_cut_does_not_match(self):
+        question = "x" * MAX_QUESTION_CHARS + " total revenue"
+        self.assertEqual(generate_sql_from_template(question), (NO_MATCH_SQL, {}))
+
+    def test_truncated_capture_is_not_bound(self):
+        question = "orders between 2024-01-01 and 2024-02-01" + "9" * MAX_QUESTION_CHARS
+        self.assertEqual(generate_sql_from_template(question), (NO_MATCH_SQL, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
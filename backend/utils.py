@@ -1,17 +1,88 @@
-from transformers import pipeline
+import re
+import threading
+import time
+from functools import lru_cache
+
 from db import engine
 from sqlalchemy import text
-from sql_templates import generate_sql_from_template  # ← add this
+from sql_templates import NO_MATCH_SQL, generate_sql_from_template  # ← add this
+
+# GPT-2 is only a fallback, so it is loaded on first use instead of at import.
+# Loads run in worker threads, so the lock keeps concurrent first misses from
+# each loading their own copy.
+_GPT2 = None
+_GPT2_LOCK = threading.Lock()
+
+def _get_gpt2():
+    """
+    Returns the GPT-2 (tokenizer, model) pair, loading it on first use.
+    Weights are kept in bfloat16 to halve the memory streamed per token on CPU.
+    """
+    global _GPT2
+    if _GPT2 is None:
+        with _GPT2_LOCK:
+            # Another thread may have finished loading while this one waited
+            if _GPT2 is None:
+                import torch
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+
+                tokenizer = AutoTokenizer.from_pretrained("gpt2")
+                model = AutoModelForCausalLM.from_pretrained("gpt2", torch_dtype=torch.bfloat16)
+                model.eval()
+                _GPT2 = (tokenizer, model)
+    return _GPT2
+
+def _sql_line_stop(tokenizer, prompt_len: int):
+    """
+    Builds a stopping criterion that ends generation once the generated text
+    contains a ';' or a newline after some non-blank content, i.e. as soon as
+    the first SQL line is complete.
+    """
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class SqlLineStop(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            done = []
+            for ids in input_ids:
+                generated = tokenizer.decode(ids[prompt_len:])
+                done.append(";" in generated or "\n" in generated.lstrip())
+            return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([SqlLineStop()])
+
+# GPT-2 output is executed as-is, so only one plain SELECT is accepted: no
+# second statement after a ';' and no INTO (OUTFILE, DUMPFILE, variables)
+_SINGLE_SELECT = re.compile(r"\s*select\b[^;]*;?\s*", re.IGNORECASE)
+_SELECT_INTO = re.compile(r"\binto\b", re.IGNORECASE)
 
-nlp = pipeline("text-generation", model="gpt2")  # still used as fallback
+def _is_single_select(sql: str) -> bool:
+    return bool(_SINGLE_SELECT.fullmatch(sql)) and not _SELECT_INTO.search(sql)
 
-def local_generate_sql(question: str, schema: str) -> str:
+def local_generate_sql(question: str, schema: str) -> tuple[str, dict]:
     # Try template-based match first
-    template_sql = generate_sql_from_template(question)
-    if template_sql:
-        return template_sql
+    sql, params = generate_sql_from_template(question)
+    if sql != NO_MATCH_SQL:
+        return sql, params
 
     # If not matched, fallback to GPT-2
+    try:
+        return _cached_generate_sql(question, schema), {}
+    except Exception as e:
+        # Not cached, so the next ask retries once the model can load again
+        print(f"LLM generation failed: {e}")
+        return NO_MATCH_SQL, {}
+
+# The schema string is part of the key, so a schema change is a cache miss.
+# Python caches str hashes and the schema comes from get_schema_metadata's
+# cache, so hits cost no more than keying on hash(schema) would.
+@lru_cache(maxsize=1024)
+def _cached_generate_sql(question: str, schema: str) -> str:
+    """
+    Returns GPT-2's SQL for the question, or NO_MATCH_SQL when the output is
+    not a single SELECT. Generation is greedy, so an unusable answer is cached
+    like a good one; failures (e.g. the model can't be loaded) raise instead.
+    """
     prompt = f"""You are a helpful assistant that converts natural language to SQL.
 Here is the database schema:
 
@@ -21,31 +92,49 @@ Translate the following question into a correct MySQL SQL query.
 Question: {question}
 SQL:"""
 
-    try:
-        response = nlp(prompt, max_length=100, do_sample=False)[0]["generated_text"]
+    import torch
 
-        if "SQL:" in response:
-            sql_lines = response.split("SQL:")[-1].strip().split("\n")
-            for line in sql_lines:
-                if "select" in line.lower():
-                    return line.strip()
-    except Exception as e:
-        print(f"LLM generation failed: {e}")
+    tokenizer, model = _get_gpt2()
+    inputs = tokenizer(prompt, return_tensors="pt")
+    prompt_len = inputs["input_ids"].shape[1]
+    with torch.inference_mode():
+        output = model.generate(
+            **inputs,
+            max_new_tokens=40,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id,
+            stopping_criteria=_sql_line_stop(tokenizer, prompt_len),
+        )
 
-    return "SELECT * FROM orders LIMIT 10;"
+    # Generation stops at the end of the first SQL line, so only the new
+    # tokens need decoding and there is a single line to check
+    sql = tokenizer.decode(output[0, prompt_len:], skip_special_tokens=True).strip()
+    # Anything else is reported as a miss rather than running some unrelated query
+    return sql if _is_single_select(sql) else NO_MATCH_SQL
 
-def get_schema_metadata() -> str:
+# Schema string and the time it was fetched; refreshed after SCHEMA_TTL seconds
+SCHEMA_TTL = 300
+_schema_cache = None
+
+async def get_schema_metadata() -> str:
     """
     Fetches table and column metadata from the connected MySQL database.
     Returns a formatted string representation of the schema.
+    The result is cached in-process for SCHEMA_TTL seconds.
     """
+    global _schema_cache
+    now = time.monotonic()
+    if _schema_cache and now - _schema_cache[1] < SCHEMA_TTL:
+        return _schema_cache[0]
+
     schema = ""
-    with engine.connect() as conn:
-        tables = conn.execute(text("SHOW TABLES")).fetchall()
+    async with engine.connect() as conn:
+        tables = (await conn.execute(text("SHOW TABLES"))).fetchall()
         for (table_name,) in tables:
             schema += f"\nTable: {table_name}\n"
-            columns = conn.execute(text(f"DESCRIBE {table_name}")).fetchall()
+            columns = (await conn.execute(text(f"DESCRIBE {table_name}"))).fetchall()
             for col in columns:
                 schema += f"  - {col[0]} ({col[1]})\n"
+    _schema_cache = (schema, now)
     return schema
 
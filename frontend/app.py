@@ -1,11 +1,20 @@
 import requests
 import streamlit as st
 import pandas as pd
+import polars as pl
 import altair as alt
-from sqlalchemy import create_engine
+import connectorx as cx
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from sqlalchemy import String, bindparam, create_engine, text
+from sqlalchemy.dialects import mysql
 from dotenv import load_dotenv
+from datetime import datetime, time, timedelta
+import io
 import os
 
+from leases_snapshot import LEASES_QUERY, SNAPSHOT_PATH, connectorx_uri, snapshot_is_fresh
+
 # Load environment variables from backend/.env
 dotenv_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend", ".env"))
 load_dotenv(dotenv_path=dotenv_path)
@@ -17,114 +26,335 @@ if not DB_URI:
     st.error("DB_URI not loaded. Check .env path or contents.")
     st.stop()
 
-# Connect to database
-engine = create_engine(DB_URI)
+CX_DB_URI = connectorx_uri(DB_URI)
+
+# A snapshot older than this is ignored and MySQL is queried instead, so a
+# stopped ETL job can't leave the dashboard on stale rows. The default leaves
+# a couple of hours of slack over a nightly export.
+SNAPSHOT_MAX_AGE = timedelta(hours=float(os.getenv("SNAPSHOT_MAX_AGE_HOURS", "26")))
+
+# Renders the connectorx queries as finished MySQL text. The engine's pymysql
+# dialect uses the pyformat paramstyle and would double every '%' in the
+# rendered literals; connectorx sends the text as-is, so '50% Off' would
+# silently stop matching. A named-paramstyle MySQL dialect keeps MySQL's
+# quoting and backslash escaping without that.
+LITERAL_DIALECT = mysql.dialect(paramstyle="named")
+
+# Arrow string types mapped to pandas' Arrow-backed string dtype when loading
+ARROW_STRINGS = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.large_string(): pd.StringDtype("pyarrow"),
+}
+
+# Streamlit re-runs this script on every interaction, so the engine (and its
+# connection pool) is created once per process via cache_resource. Pool
+# settings match backend/db.py; pool_pre_ping and pool_recycle keep MySQL from
+# handing back connections it has already closed.
+@st.cache_resource
+def get_engine():
+    return create_engine(
+        DB_URI,
+        pool_size=20,
+        max_overflow=30,
+        pool_recycle=3600,
+        pool_pre_ping=True,
+    )
+
+# One HTTP session per process, so questions to the backend reuse a pooled
+# keep-alive connection instead of opening a new socket each time
+@st.cache_resource
+def http():
+    session = requests.Session()
+    if API_KEY:
+        session.headers.update({"X-API-Key": API_KEY})
+    return session
 
 st.set_page_config(page_title="AI Real Estate Dashboard", layout="wide")
 
-@st.cache_data
-def load_data():
-    query = """
-    SELECT 
-        o.id AS order_id,
-        o.order_date,
-        o.quantity,
-        p.id AS product_id,
-        p.name AS product_name,
-        p.category,
-        p.price,
-        u.name AS user_name,
-        u.email
-    FROM orders o
-    LEFT JOIN products p ON o.product_id = p.id
-    LEFT JOIN users u ON o.user_id = u.id
+@st.cache_data(ttl=300)
+def load_filter_options(source):
+    """
+    Fetches what the sidebar widgets need (categories, property names, date
+    and price bounds) with small queries instead of loading every order.
+    They come from the same source as the rows (see load_data), so the
+    sidebar never offers options or dates the charts can't show.
+    """
+    if source == "snapshot":
+        options = pl.scan_parquet(SNAPSHOT_PATH).select(
+            pl.col("category").drop_nulls().unique().sort().implode(),
+            pl.col("product_name").drop_nulls().unique().sort().implode(),
+            pl.col("order_date").min().alias("min_date"),
+            pl.col("order_date").max().alias("max_date"),
+            pl.col("price").max().alias("max_price"),
+        ).collect().row(0, named=True)
+        return (
+            options["category"], options["product_name"],
+            pd.Timestamp(options["min_date"]).date(), pd.Timestamp(options["max_date"]).date(),
+            int(options["max_price"]),
+        )
+
+    with get_engine().connect() as conn:
+        categories = conn.execute(text(
+            "SELECT DISTINCT category FROM products WHERE category IS NOT NULL ORDER BY category"
+        )).scalars().all()
+        product_names = conn.execute(text(
+            "SELECT DISTINCT name FROM products WHERE name IS NOT NULL ORDER BY name"
+        )).scalars().all()
+        min_date, max_date = conn.execute(text(
+            "SELECT MIN(order_date), MAX(order_date) FROM orders"
+        )).one()
+        max_price = conn.execute(text("SELECT MAX(price) FROM products")).scalar()
+    return categories, product_names, pd.Timestamp(min_date).date(), pd.Timestamp(max_date).date(), int(max_price)
+
+def query_leases(start_date, end_date, price_min, price_max, categories, product_names):
+    """Runs the filtered leases query against MySQL and returns an Arrow table."""
+    query = LEASES_QUERY + """
+    WHERE o.order_date >= :start_date AND o.order_date < :end_date
+      AND p.price BETWEEN :price_min AND :price_max
+    """
+    # End bound is exclusive so the whole end day is included
+    params = {
+        "start_date": start_date.isoformat(),
+        "end_date": (end_date + timedelta(days=1)).isoformat(),
+        "price_min": price_min,
+        "price_max": price_max,
+    }
+    in_params = []
+    if categories:
+        query += " AND p.category IN :categories"
+        params["categories"] = list(categories)
+        in_params.append(bindparam("categories", type_=String, expanding=True))
+    if product_names:
+        query += " AND p.name IN :product_names"
+        params["product_names"] = list(product_names)
+        in_params.append(bindparam("product_names", type_=String, expanding=True))
+    # Sorted by date so downstream per-day grouping needs no sort of its own;
+    # MySQL can return rows in order straight from the order_date range scan
+    query += " ORDER BY o.order_date"
+    stmt = text(query).bindparams(*in_params).bindparams(**params)
+
+    # connectorx reads the result straight into Arrow buffers in Rust, skipping
+    # per-row Python objects. It needs a finished SQL string, so the bind
+    # values are rendered as literals escaped by the MySQL dialect. The IN
+    # lists are typed, as an untyped bind has no literal renderer.
+    sql = str(stmt.compile(dialect=LITERAL_DIALECT, compile_kwargs={"literal_binds": True}))
+    return cx.read_sql(CX_DB_URI, sql, return_type="arrow")
+
+def scan_leases(start_date, end_date, price_min, price_max, categories, product_names):
     """
-    df = pd.read_sql(query, engine)
+    Reads the filtered leases from the Parquet snapshot and returns an Arrow
+    table. The filters are pushed into the scan, so row groups whose date
+    statistics fall outside the range are never read. The snapshot is sorted
+    by order_date and the scan keeps that order.
+    """
+    predicates = [
+        pl.col("order_date") >= datetime.combine(start_date, time.min),
+        pl.col("order_date") < datetime.combine(end_date + timedelta(days=1), time.min),
+        pl.col("price").is_between(price_min, price_max),
+    ]
+    if categories:
+        predicates.append(pl.col("category").is_in(list(categories)))
+    if product_names:
+        predicates.append(pl.col("product_name").is_in(list(product_names)))
+    # Oldest compat level gives plain large_string columns, which ARROW_STRINGS maps
+    return (
+        pl.scan_parquet(SNAPSHOT_PATH)
+        .filter(*predicates)
+        .collect()
+        .to_arrow(compat_level=pl.CompatLevel.oldest())
+    )
+
+# Every slider position is its own entry, so max_entries caps how many live
+# frames the process holds at once
+@st.cache_resource(ttl=300, max_entries=16)
+def load_data(source, start_date, end_date, price_min, price_max, categories, product_names):
+    """
+    Loads the orders matching the sidebar filters: dates between start_date
+    and end_date (inclusive), price within [price_min, price_max], and the
+    given categories / property names when any are selected. Rows come from
+    the Parquet snapshot written by leases_snapshot.py when source is
+    "snapshot", and from MySQL when it is "mysql"; either way only the
+    matching rows are read.
+
+    Returns (df, load_id). load_id names where this frame was read from and
+    when, so caches built from the frame can key on it and never outlive a
+    reload.
+
+    Cached as a resource, so every session gets the same frame object without
+    a pickle round trip; callers must treat it as read-only.
+    """
+    load = scan_leases if source == "snapshot" else query_leases
+    table = load(start_date, end_date, price_min, price_max, categories, product_names)
+
+    # Text stays in Arrow buffers (string[pyarrow]) instead of a Python str per cell
+    df = table.to_pandas(types_mapper=ARROW_STRINGS.get)
     df["order_date"] = pd.to_datetime(df["order_date"])
     df["revenue"] = df["quantity"] * df["price"]
-    return df
+    # Halve the width of the inputs once revenue is derived. revenue itself
+    # stays float64 since it is summed into portfolio totals, where float32
+    # would lose KES. to_numeric leaves a column alone if it can't downcast
+    # it, e.g. a quantity column holding NULLs.
+    df["price"] = pd.to_numeric(df["price"], downcast="float")
+    df["quantity"] = pd.to_numeric(df["quantity"], downcast="integer")
+    # Low-cardinality text as categoricals so counts and groupbys work on
+    # integer codes instead of hashing strings
+    for col in ("category", "product_name", "user_name"):
+        df[col] = df[col].astype("category")
+    return df, (source, datetime.now())
+
+@st.cache_data(ttl=300)
+def product_revenue(filter_key, _filtered_pl):
+    """
+    Revenue per property, highest first. filter_key identifies the filtered
+    frame, so Streamlit hashes that small tuple instead of the frame itself.
+    """
+    return (
+        _filtered_pl.filter(pl.col("product_name").is_not_null())
+        .group_by("product_name").agg(pl.col("revenue").sum())
+        # group_by returns groups in no fixed order; the name breaks ties so
+        # the Top 10 cut is the same on every run and from either data source.
+        # Cast so names compare as text, not by categorical code.
+        .sort(["revenue", pl.col("product_name").cast(pl.String)], descending=[True, False])
+    )
+
+@st.cache_data(ttl=300)
+def daily_leases(filter_key, _filtered_df):
+    """
+    Lease count per day for the frame behind filter_key. Days come from
+    flooring the datetime64 values, so no Python date objects are built.
+    load_data returns rows sorted by order_date, so the groups already come
+    out in date order and the grouping skips its sort.
+    """
+    days = _filtered_df["order_date"].dt.floor("D")
+    return (
+        days.groupby(days, sort=False)
+        .size()
+        .rename_axis("lease_day")
+        .reset_index(name="order_id")
+    )
 
-@st.cache_data
+def dataframe_to_csv(dataframe):
+    # Arrow's C++ CSV writer encodes column by column straight into bytes,
+    # instead of pandas building one big Python string first
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+    # Categoricals arrive as dictionary columns; write their values
+    table = pa.table(
+        [col.cast(col.type.value_type) if pa.types.is_dictionary(col.type) else col for col in table.columns],
+        names=table.column_names,
+    )
+    buf = io.BytesIO()
+    pa_csv.write_csv(table, buf)
+    return buf.getvalue()
+
+# No TTL: the bytes only depend on the frame passed in. max_entries bounds the
+# memory held by CSVs nobody downloads again.
+@st.cache_data(max_entries=32)
 def convert_df_to_csv(dataframe):
-    return dataframe.to_csv(index=False).encode("utf-8")
+    return dataframe_to_csv(dataframe)
+
+@st.cache_data(ttl=300, max_entries=32)
+def filtered_csv(filter_key, _filtered_df):
+    """
+    CSV bytes of the frame behind filter_key. Keyed on that small tuple so a
+    lookup doesn't hash the whole frame. filter_key carries load_data's
+    load_id, so a reload misses here; the TTL only evicts entries for frames
+    that have since been replaced.
+    """
+    return dataframe_to_csv(_filtered_df)
 
-df = load_data()
+# Decided once per run so the sidebar options and the rows agree. A fresh
+# snapshot serves both, and the page doesn't touch MySQL at all.
+source = "snapshot" if snapshot_is_fresh(SNAPSHOT_MAX_AGE) else "mysql"
+category_options, product_options, min_order_date, max_order_date, max_price = load_filter_options(source)
 
 # Sidebar filters
 with st.sidebar:
     st.header("Filters")
 
-    categories = st.multiselect("Unit Type", df["category"].dropna().unique(), default=list(df["category"].dropna().unique()))
-    product_names = st.multiselect("Property", sorted(df["product_name"].dropna().unique()))
+    categories = st.multiselect("Unit Type", category_options, default=category_options)
+    product_names = st.multiselect("Property", product_options)
 
     date_mode = st.radio("Filter By Date:", ["Single Date", "Date Range"], horizontal=True)
     if date_mode == "Single Date":
-        selected_date = st.date_input("Select Date", value=df["order_date"].min().date())
+        selected_date = st.date_input("Select Date", value=min_order_date)
         start_date = end_date = selected_date
     else:
-        start_date = st.date_input("Start Date", value=df["order_date"].min().date())
-        end_date = st.date_input("End Date", value=df["order_date"].max().date())
+        start_date = st.date_input("Start Date", value=min_order_date)
+        end_date = st.date_input("End Date", value=max_order_date)
         if start_date > end_date:
             st.warning("Start date cannot be after end date.")
             st.stop()
 
-    price_min, price_max = st.slider("Price Range (KES)", min_value=0, max_value=int(df["price"].max()), value=(0, int(df["price"].max())))
+    price_min, price_max = st.slider("Price Range (KES)", min_value=0, max_value=max_price, value=(0, max_price))
 
-# Filter application
-filtered_df = df[
-    (df["order_date"].dt.date >= start_date) &
-    (df["order_date"].dt.date <= end_date) &
-    (df["price"] >= price_min) &
-    (df["price"] <= price_max)
-]
+# All sidebar filters are applied in SQL. The frame is shared across sessions
+# (see load_data), so it is only ever read below.
+# Selections are sorted so picking the same options in another order shares
+# one cached frame.
+categories, product_names = tuple(sorted(categories)), tuple(sorted(product_names))
+filtered_df, load_id = load_data(source, start_date, end_date, price_min, price_max, categories, product_names)
+# Identifies filtered_df for caches that would otherwise hash the whole frame.
+# load_id changes on every reload, so those caches never serve results built
+# from an earlier frame for the same filters.
+filter_key = (load_id, start_date, end_date, price_min, price_max, categories, product_names)
+# Polars frame for the Overview aggregations; only the small aggregated frames
+# are converted back to pandas for Altair
+filtered_pl = pl.from_pandas(filtered_df)
 
-if categories:
-    filtered_df = filtered_df[filtered_df["category"].isin(categories)]
-if product_names:
-    filtered_df = filtered_df[filtered_df["product_name"].isin(product_names)]
-
-# Tabs
-overview_tab, ai_tab, raw_data_tab = st.tabs(["📊 Overview", "🤖 AI Assistant", "📄 Raw Data"])
-
-with overview_tab:
+# Overview and AI Assistant are fragments: interacting with widgets inside
+# one (asking a question, downloading a CSV) reruns only that fragment, not
+# the data load and every chart on the page. Sidebar changes still rerun all.
+@st.fragment
+def render_overview(filtered_df, filtered_pl, filter_key):
     st.title("Portfolio Dashboard")
 
+    # Shared by several sections below. Null keys are dropped to match the
+    # pandas groupby/value_counts this replaced, which skip NaN. Ties are
+    # broken by name, so Top Unit Type doesn't change between reruns.
+    category_counts = (
+        filtered_pl.filter(pl.col("category").is_not_null())
+        .group_by("category").len(name="count")
+        .sort(["count", pl.col("category").cast(pl.String)], descending=[True, False])
+    )
+    product_perf = product_revenue(filter_key, filtered_pl)
+
     # Key Metrics
     with st.expander("Key Metrics", expanded=True):
+        # One select so Polars computes all the column aggregates together.
+        # Means of an empty frame are null; show them as NaN like pandas did.
+        metrics = filtered_pl.select(
+            pl.col("revenue").sum(),
+            pl.col("user_name").drop_nulls().n_unique().alias("tenants"),
+            pl.col("price").mean().fill_null(float("nan")),
+            pl.col("quantity").mean().fill_null(float("nan")),
+        ).row(0, named=True)
+
         col1, col2, col3 = st.columns(3)
-        col1.metric("Total Units", filtered_df["order_id"].nunique())
-        col2.metric("Revenue", f"KES {filtered_df['revenue'].sum():,.2f}")
-        col3.metric("Tenants", filtered_df["user_name"].nunique())
+        # Orders only join many-to-one onto products/users, so every row is a
+        # distinct order_id and the row count is the distinct count
+        col1.metric("Total Units", len(filtered_df))
+        col2.metric("Revenue", f"KES {metrics['revenue']:,.2f}")
+        col3.metric("Tenants", metrics["tenants"])
 
         col4, col5, col6 = st.columns(3)
-        col4.metric("Avg Monthly Rent", f"KES {filtered_df['price'].mean():,.0f}")
-        col5.metric("Avg Lease Duration", f"{filtered_df['quantity'].mean():.1f} months")
-        top_category = (
-            filtered_df["category"].value_counts().idxmax()
-            if not filtered_df["category"].isnull().all()
-            else "N/A"
-        )
+        col4.metric("Avg Monthly Rent", f"KES {metrics['price']:,.0f}")
+        col5.metric("Avg Lease Duration", f"{metrics['quantity']:.1f} months")
+        top_category = category_counts["category"][0] if category_counts.height else "N/A"
         col6.metric("Top Unit Type", top_category)
 
         col7, _, _ = st.columns(3)
-        repeat_tenants = (
-            filtered_df.groupby("user_name")["order_id"]
-            .count()
-            .reset_index()
+        repeat_count = (
+            filtered_pl.filter(pl.col("user_name").is_not_null())
+            .group_by("user_name").len()
+            .filter(pl.col("len") > 1)
+            .height
         )
-        repeat_count = repeat_tenants[repeat_tenants["order_id"] > 1].shape[0]
         col7.metric("Repeat Tenants", repeat_count)
 
     # Product Performance
     with st.expander("Product Performance", expanded=True):
-        product_perf = (
-            filtered_df.groupby("product_name")["revenue"]
-            .sum()
-            .reset_index()
-            .sort_values(by="revenue", ascending=False)
-        )
-        if not product_perf.empty:
-            chart = alt.Chart(product_perf).mark_bar().encode(
+        if product_perf.height:
+            chart = alt.Chart(product_perf.to_pandas()).mark_bar().encode(
                 x=alt.X("product_name:N", sort="-y", title="Product Name"),
                 y=alt.Y("revenue:Q", title="Revenue (KES)"),
                 tooltip=["product_name", "revenue"]
@@ -139,15 +369,10 @@ with overview_tab:
 
     # Top Revenue-Generating Properties
     with st.expander("Top Revenue-Generating Properties", expanded=True):
-        top_units = (
-            filtered_df.groupby("product_name")["revenue"]
-            .sum()
-            .reset_index()
-            .sort_values(by="revenue", ascending=False)
-            .head(10)
-        )
-        if not top_units.empty:
-            chart = alt.Chart(top_units).mark_bar().encode(
+        # Same aggregation as Product Performance, so reuse it
+        top_units = product_perf.head(10)
+        if top_units.height:
+            chart = alt.Chart(top_units.to_pandas()).mark_bar().encode(
                 x=alt.X("product_name:N", sort="-y", title="Product Name"),
                 y=alt.Y("revenue:Q", title="Revenue (KES)"),
                 tooltip=["product_name", "revenue"]
@@ -162,10 +387,8 @@ with overview_tab:
 
     # Leases Over Time
     with st.expander("Leases Over Time", expanded=True):
-        trend = filtered_df.copy()
-        if not trend.empty:
-            trend["lease_day"] = trend["order_date"].dt.date
-            trend_grouped = trend.groupby("lease_day")["order_id"].count().reset_index()
+        if not filtered_df.empty:
+            trend_grouped = daily_leases(filter_key, filtered_df)
             chart = alt.Chart(trend_grouped).mark_line(point=True).encode(
                 x=alt.X("lease_day:T", title="Date"),
                 y=alt.Y("order_id:Q", title="Lease Count"),
@@ -181,42 +404,38 @@ with overview_tab:
 
     # Lease Duration Distribution
     with st.expander("Lease Duration Distribution", expanded=False):
-        duration_dist = filtered_df["quantity"].value_counts().reset_index()
-        duration_dist.columns = ["quantity", "count"]
-        chart = alt.Chart(duration_dist).mark_bar().encode(
-            x=alt.X("quantity:O", title="Lease Duration (Months)"),
-            y=alt.Y("count:Q", title="Number of Leases"),
-            tooltip=["quantity", "count"]
-        ).properties(
-            width=700, height=300, title="Lease Duration Distribution"
+        duration_dist = (
+            filtered_pl.filter(pl.col("quantity").is_not_null())
+            .group_by("quantity").len(name="count")
+            .sort("quantity")
+        )
+        # Plain count bars: Streamlit's native chart is enough and skips
+        # building an Altair spec on every rerun
+        st.bar_chart(
+            duration_dist.to_pandas(), x="quantity", y="count",
+            x_label="Lease Duration (Months)", y_label="Number of Leases", height=300,
         )
-        st.altair_chart(chart, use_container_width=True)
 
     # Unit Type Distribution
     with st.expander("Unit Type Distribution", expanded=False):
-        unit_counts = filtered_df["category"].value_counts().reset_index()
-        unit_counts.columns = ["category", "count"]
-        chart = alt.Chart(unit_counts).mark_bar().encode(
-            x=alt.X("category:N", title="Unit Type"),
-            y=alt.Y("count:Q", title="Count"),
-            tooltip=["category", "count"]
-        ).properties(
-            width=700, height=300, title="Unit Type Distribution"
+        st.bar_chart(
+            category_counts.to_pandas(), x="category", y="count",
+            x_label="Unit Type", y_label="Count", height=300,
         )
-        st.altair_chart(chart, use_container_width=True)
 
     # Download
     with st.expander("*Download Filtered Data", expanded=False):
-        st.download_button("Download CSV", convert_df_to_csv(filtered_df), "leases.csv", "text/csv")
+        st.download_button("Download CSV", filtered_csv(filter_key, filtered_df), "leases.csv", "text/csv")
 
-with ai_tab:
+@st.fragment
+def render_ai_assistant():
     st.header("🤖 Ask AI About Your Portfolio")
     question = st.text_input("Ask a question about your data")
     if question:
         with st.spinner("Thinking..."):
             try:
-                headers = {"X-API-Key": API_KEY} if API_KEY else {}
-                response = requests.post("http://localhost:8000/ask", json={"question": question}, headers=headers)
+                # Bounded so a stalled backend surfaces as an error, not an endless spinner
+                response = http().post("http://localhost:8000/ask", json={"question": question}, timeout=30)
                 result = response.json()
                 if "result" in result:
                     ai_df = pd.DataFrame(result["result"])
@@ -232,6 +451,25 @@ with ai_tab:
             except Exception as e:
                 st.error(f"Error: {e}")
 
-with raw_data_tab:
+# Only a preview of the filtered rows is sent to the browser; the full frame
+# is available through the CSV download on the Overview tab. A fragment, so
+# changing the row count doesn't rerun the rest of the page.
+@st.fragment
+def render_raw_data(filtered_df):
     st.header("📄 Raw Leases Data")
-    st.dataframe(filtered_df)
+    n = st.number_input("Rows to preview", 1000, 100000, 5000)
+    st.caption(f"Showing {min(n, len(filtered_df)):,} of {len(filtered_df):,} rows. Download the CSV from the Overview tab for all of them.")
+    # Handed over as Arrow, which is what Streamlit sends to the browser anyway
+    st.dataframe(pa.Table.from_pandas(filtered_df.iloc[:n], preserve_index=False))
+
+# Tabs
+overview_tab, ai_tab, raw_data_tab = st.tabs(["📊 Overview", "🤖 AI Assistant", "📄 Raw Data"])
+
+with overview_tab:
+    render_overview(filtered_df, filtered_pl, filter_key)
+
+with ai_tab:
+    render_ai_assistant()
+
+with raw_data_tab:
+    render_raw_data(filtered_df)
@@ -0,0 +1,69 @@
+"""
+Exports the dashboard's leases dataset (orders joined to products and users)
+to a Parquet snapshot sorted by order_date. Run it from the ETL schedule,
+e.g. nightly:
+
+    python leases_snapshot.py
+
+While the snapshot exists and is recent enough, app.py scans it instead of
+querying MySQL.
+"""
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import polars as pl
+from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
+
+SNAPSHOT_PATH = Path(__file__).resolve().parent / "leases.parquet"
+
+# Row-level leases dataset; callers append their own WHERE / ORDER BY
+LEASES_QUERY = """
+    SELECT
+        o.id AS order_id,
+        o.order_date,
+        o.quantity,
+        p.id AS product_id,
+        p.name AS product_name,
+        p.category,
+        p.price,
+        u.name AS user_name,
+        u.email
+    FROM orders o
+    LEFT JOIN products p ON o.product_id = p.id
+    LEFT JOIN users u ON o.user_id = u.id
+    """
+
+def connectorx_uri(db_uri: str) -> str:
+    """connectorx takes a plain mysql:// URI rather than SQLAlchemy's mysql+driver form."""
+    return make_url(db_uri).set(drivername="mysql").render_as_string(hide_password=False)
+
+def snapshot_is_fresh(max_age: timedelta, path: Path = SNAPSHOT_PATH) -> bool:
+    """True when the snapshot at path exists and was written less than max_age ago."""
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return time.time() - mtime < max_age.total_seconds()
+
+def export_snapshot(db_uri: str, path: Path = SNAPSHOT_PATH) -> None:
+    """
+    Writes the leases dataset to path, sorted by order_date so each row
+    group's min/max statistics cover a narrow date range and date-filtered
+    scans can skip most of the file.
+    """
+    df = pl.read_database_uri(LEASES_QUERY, connectorx_uri(db_uri)).sort("order_date")
+    # Write next to the target and swap it in, so the dashboard never reads
+    # a half-written file
+    tmp_path = path.with_suffix(".parquet.tmp")
+    df.write_parquet(tmp_path, row_group_size=100_000, statistics=True)
+    tmp_path.replace(path)
+
+if __name__ == "__main__":
+    load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / "backend" / ".env")
+    db_uri = os.getenv("DB_URI")
+    if not db_uri:
+        raise ValueError("DB_URI not found in environment variables.")
+    export_snapshot(db_uri)